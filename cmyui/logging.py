@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import sys
+import threading
+import time
+import warnings
 from datetime import tzinfo
 from enum import IntEnum
-from functools import cache
-from functools import lru_cache
 from typing import Union
 from typing import Optional
+from typing import TextIO
 from typing import overload
 from zoneinfo import ZoneInfo
 
@@ -15,7 +18,8 @@ from .utils import rainbow_color_stops
 
 __all__ = ('Ansi', 'RGB', 'Rainbow', 'printc',
            '_fmt_rainbow', 'print_rainbow',
-           'set_timezone', 'log')
+           'set_timezone', 'log', 'flush_output',
+           'close_log_files')
 
 class Ansi(IntEnum):
     # Default colours
@@ -40,34 +44,47 @@ class Ansi(IntEnum):
 
     RESET = 0
 
-    @cache
     def __repr__(self) -> str:
-        return f'\x1b[{self.value}m'
+        return self.prefix
+
+# precompute each colour's escape sequence once, at import.
+for _col in Ansi:
+    _col.prefix = f'\x1b[{_col.value}m'
+del _col
 
 class RGB:
+    __slots__ = ('r', 'g', 'b', 'prefix')
+
     @overload
-    def __init__(self, rgb: int) -> None: ...
+    def __init__(self, rgb: int) -> None: ... # deprecated
     @overload
     def __init__(self, r: int, g: int, b: int) -> None: ...
 
-    def __init__(self, *args) -> None:
-        largs = len(args)
-
-        if largs == 3:
-            # r, g, b passed.
-            self.r, self.g, self.b = args
-        elif largs == 1:
-            # passed as single argument
-            rgb = args[0]
-            self.b = rgb & 0xff
-            self.g = (rgb >> 8) & 0xff
-            self.r = (rgb >> 16) & 0xff
-        else:
+    def __init__(self, r: int, g: Optional[int] = None,
+                 b: Optional[int] = None) -> None:
+        if g is None and b is None:
+            # passed as a single (packed) argument
+            warnings.warn(
+                'RGB(0xRRGGBB) is deprecated, use RGB.from_packed(0xRRGGBB)',
+                DeprecationWarning, stacklevel=2
+            )
+            r, g, b = (r >> 16) & 0xff, (r >> 8) & 0xff, r & 0xff
+        elif g is None or b is None:
             raise ValueError('Incorrect params for RGB.')
 
-    @lru_cache(maxsize=64)
+        self.r = r
+        self.g = g
+        self.b = b
+
+        self.prefix = f'\x1b[38;2;{r};{g};{b}m'
+
+    @classmethod
+    def from_packed(cls, rgb: int) -> 'RGB':
+        """Create an RGB colour from a packed integer (0xRRGGBB)."""
+        return cls((rgb >> 16) & 0xff, (rgb >> 8) & 0xff, rgb & 0xff)
+
     def __repr__(self) -> str:
-        return f'\x1b[38;2;{self.r};{self.g};{self.b}m'
+        return self.prefix
 
 class _Rainbow: ...
 Rainbow = _Rainbow()
@@ -77,52 +94,150 @@ Colour_Types = Union[Ansi, RGB, _Rainbow]
 stdout_write = sys.stdout.write
 stdout_flush = sys.stdout.flush
 
-_gray = repr(Ansi.GRAY)
-_reset = repr(Ansi.RESET)
-
-def printc(msg: str, col: Colour_Types, end: str = '\n') -> None:
+_gray = Ansi.GRAY.prefix
+_reset = Ansi.RESET.prefix
+
+# rather than flushing stdout after every print, it's only flushed
+# when requested (or for errors), or if it's been FLUSH_INTERVAL secs
+# since the last flush; this coalesces bursts of output into fewer
+# writes when stdout is block buffered (i.e. not a tty). output that
+# isn't flushed immediately is flushed FLUSH_INTERVAL secs later.
+FLUSH_INTERVAL = 0.05
+_last_flush = 0.0
+_flush_scheduled = False
+_flush_lock = threading.Lock()
+
+# files written to by log(), kept open for the process' lifetime
+# rather than being re-opened & closed for every logged line.
+_log_files: dict[str, TextIO] = {}
+_error_colours = (Ansi.RED, Ansi.LRED)
+
+def flush_output() -> None:
+    """Flush any output which hasn't been written yet."""
+    global _last_flush, _flush_scheduled
+
+    with _flush_lock:
+        _flush_scheduled = False
+        stdout_flush()
+        _last_flush = time.monotonic()
+
+def _deferred_flush() -> None:
+    try:
+        flush_output()
+    except ValueError:
+        # stdout was closed (the interpreter is shutting down)
+        pass
+
+def _schedule_flush() -> None:
+    global _flush_scheduled
+
+    with _flush_lock:
+        if _flush_scheduled:
+            return
+
+        _flush_scheduled = True
+
+    # a timer thread rather than the event loop's call_later(),
+    # since the loop may be closed before the flush is due.
+    timer = threading.Timer(FLUSH_INTERVAL, _deferred_flush)
+    timer.daemon = True
+    timer.start()
+
+def _flush_stdout(force: bool) -> None:
+    if force or time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush_output()
+    elif not _flush_scheduled:
+        # flush whatever's written until then.
+        _schedule_flush()
+
+def printc(msg: str, col: Colour_Types, end: str = '\n',
+           flush: bool = False) -> None:
     """Print a string, in a specified ansi colour."""
-    stdout_write(f'{col!r}{msg}{_reset}{end}')
-    stdout_flush()
-
-def _fmt_rainbow(msg: str, end: float = 2 / 3) -> None:
-    cols = [RGB(*map(int, rgb)) for rgb in rainbow_color_stops(n=len(msg), end=end)]
-    return ''.join([f'{cols[i]!r}{c}' for i, c in enumerate(msg)]) + repr(Ansi.RESET)
-
-def print_rainbow(msg: str, rainbow_end: float = 2 / 3, end: str = '\n') -> None:
-    stdout_write(f'{_fmt_rainbow(msg, rainbow_end)}{end}')
-    stdout_flush()
+    stdout_write(f'{col.prefix}{msg}{_reset}{end}')
+    _flush_stdout(flush or col in _error_colours)
+
+def _fmt_rainbow(msg: str, end: float = 2 / 3) -> str:
+    stops = rainbow_color_stops(n=len(msg), end=end)
+    return ''.join([
+        f'\x1b[38;2;{r};{g};{b}m{c}'
+        for c, (r, g, b) in zip(msg, stops)
+    ]) + _reset
+
+def print_rainbow(msg: str, rainbow_end: float = 2 / 3, end: str = '\n',
+                  flush: bool = False) -> None:
+    # written separately, rather than copying the
+    # whole formatted string just to append `end`.
+    stdout_write(_fmt_rainbow(msg, rainbow_end))
+    stdout_write(end)
+    _flush_stdout(flush)
 
 # TODO: better solution than this; this at least requires the
 # iana/tzinfo database to be installed, meaning it's limited.
 _log_tz = ZoneInfo('GMT') # default
 def set_timezone(tz: tzinfo) -> None:
-    global _log_tz
+    global _log_tz, _ts_cache_time
     _log_tz = tz
+    _ts_cache_time = -1 # invalidate cached timestamps
+
+# timestamps are only precise to the second, so
+# they only need to be formatted once per second.
+_ts_cache_time = -1
+_ts_cache: dict[bool, str] = {}
+
+def _log_timestamp(full: bool) -> str:
+    """Get the (cached) timestamp for the current second."""
+    global _ts_cache_time
+
+    if (now := int(time.time())) != _ts_cache_time:
+        _ts_cache_time = now
+        _ts_cache.clear()
+
+    if (ts := _ts_cache.get(full)) is None:
+        ts = _ts_cache[full] = get_timestamp(full=full, tz=_log_tz)
+
+    return ts
+
+@atexit.register
+def close_log_files() -> None:
+    """Close (flushing) all files opened by log()."""
+    for f in _log_files.values():
+        f.close()
+
+    _log_files.clear()
 
 def log(msg: str, col: Optional[Colour_Types] = None,
-        file: Optional[str] = None, end: str = '\n') -> None:
+        file: Optional[str] = None, end: str = '\n',
+        flush: bool = False) -> None:
     """\
     Print a string, in a specified ansi colour with timestamp.
 
     Allows for the functionality to write to a file as
     well by passing the filepath with the `file` parameter.
+
+    Lines written to the file are flushed immediately; stdout is
+    flushed immediately for red (error) logs, or if `flush` is passed,
+    otherwise flushes may be coalesced.
     """
 
-    ts_short = get_timestamp(full=False, tz=_log_tz)
+    ts_short = _log_timestamp(full=False)
 
     if col:
         if col is Rainbow:
-            print_rainbow(msg, end=end)
+            stdout_write(_fmt_rainbow(msg))
+            stdout_write(end)
         else:
             # normal colour
-            stdout_write(f'{_gray}[{ts_short}] {col!r}{msg}{_reset}{end}')
+            stdout_write(f'{_gray}[{ts_short}] {col.prefix}{msg}{_reset}{end}')
     else:
         stdout_write(f'{_gray}[{ts_short}]{_reset} {msg}{end}')
 
-    stdout_flush()
-
     if file:
         # log simple ascii output to file.
-        with open(file, 'a+') as f:
-            f.write(f'[{get_timestamp(full=True, tz=_log_tz)}] {msg}\n')
+        if (f := _log_files.get(file)) is None:
+            # line buffered, so each line is written as it's logged.
+            f = _log_files[file] = open(file, 'a', buffering=1,
+                                        encoding='utf-8')
+
+        f.write(f'[{_log_timestamp(full=True)}] {msg}\n')
+
+    _flush_stdout(flush or col in _error_colours)
@@ -1,19 +1,27 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any
 from typing import AsyncGenerator
+from typing import AsyncIterator
+from typing import Iterator
 from typing import Optional
 from typing import Sequence
 from typing import Union
 
 import aiomysql
 import mysql.connector.pooling
+from mysql.connector.pooling import PooledMySQLConnection
 
 __all__ = (
     # Informational
     'SQLParams',
     'DictSQLResult',
     'TupleSQLResult',
+    'ColumnarSQLResult',
 
     # Functional
     'AsyncSQLPool',
@@ -23,6 +31,16 @@ __all__ = (
 SQLParams = Sequence[Any]
 DictSQLResult = Optional[dict[str, Any]]
 TupleSQLResult = Optional[tuple[Any, ...]]
+ColumnarSQLResult = dict[str, list[Any]]
+
+# the connections pinned by each pool's connection(). these are never
+# mutated, only replaced; async pins also hold the task which pinned
+# them, since tasks created within the context will inherit it, but
+# mustn't use the same connection concurrently.
+_pinned_conns: ContextVar[dict['AsyncSQLPool', tuple[asyncio.Task, aiomysql.Connection]]] = \
+    ContextVar('pinned_conns', default={})
+_pinned_cnxs: ContextVar[dict['SQLPool', PooledMySQLConnection]] = \
+    ContextVar('pinned_cnxs', default={})
 
 class AsyncSQLPool:
     """A thin wrapper around an asynchronous mysql pool
@@ -41,9 +59,53 @@ class AsyncSQLPool:
         self.pool.close()
         await self.pool.wait_closed()
 
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiomysql.Connection]:
+        """Acquire a connection, to be used by all queries within the context.
+
+           Saves a trip through the pool for each query; the connection
+           is only used by the current task (tasks created within the
+           context will acquire their own connections).
+
+           NOTE: iterall() always acquires a separate connection, even
+           within this context; with a pool of size 1 (or with all of
+           the pool's connections pinned), using it here will deadlock."""
+        if (conn := self._pinned()) is not None:
+            # already pinned by an outer context.
+            yield conn
+            return
+
+        async with self.pool.acquire() as conn:
+            token = _pinned_conns.set({
+                **_pinned_conns.get(),
+                self: (asyncio.current_task(), conn)
+            })
+            try:
+                yield conn
+            finally:
+                _pinned_conns.reset(token)
+
+    def _pinned(self) -> Optional[aiomysql.Connection]:
+        """Get the connection pinned by the current task, if any."""
+        if (pin := _pinned_conns.get().get(self)) is not None:
+            task, conn = pin
+            if task is asyncio.current_task():
+                return conn
+
+    @asynccontextmanager
+    async def _acquire(self) -> AsyncIterator[aiomysql.Connection]:
+        """Use the pinned connection, or acquire one for a single query."""
+        # the connection isn't pinned here, since iterall() could
+        # be abandoned midway, leaving it pinned in the caller's context.
+        if (conn := self._pinned()) is not None:
+            yield conn
+        else:
+            async with self.pool.acquire() as conn:
+                yield conn
+
     async def execute(self, query: str, params: SQLParams = []) -> int:
         """Acquire a connection & execute a given querystring."""
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor(aiomysql.Cursor) as cur:
                 await cur.execute(query, params)
                 await conn.commit()
@@ -61,10 +123,14 @@ class AsyncSQLPool:
         cursor_type = (aiomysql.DictCursor if _dict else
                        aiomysql.Cursor)
 
-        async with self.pool.acquire() as conn:
+        async with self._acquire() as conn:
             async with conn.cursor(cursor_type) as cur:
                 await cur.execute(query, params)
-                return await (cur.fetchall if _all else cur.fetchone)()
+
+                if _all:
+                    return await cur.fetchall()
+                else:
+                    return await cur.fetchone()
 
     async def fetchall(
         self, query: str,
@@ -75,15 +141,53 @@ class AsyncSQLPool:
            rows for a given querystring."""
         return await self.fetch(query, params, _all=True, _dict=_dict)
 
+    async def fetchall_columnar(
+        self, query: str,
+        params: SQLParams = []
+    ) -> ColumnarSQLResult:
+        """Acquire a connection & fetch all result rows for a
+           given querystring, as lists of values per column.
+
+           Raises ValueError if the result has duplicate column
+           names (e.g. from a join), as they'd overwrite each other;
+           alias them to distinct names in the query instead."""
+        async with self._acquire() as conn:
+            async with conn.cursor(aiomysql.Cursor) as cur:
+                await cur.execute(query, params)
+
+                if cur.description is None:
+                    # the statement has no result set.
+                    return {}
+
+                rows = await cur.fetchall()
+                cols = [desc[0] for desc in cur.description]
+
+        if len(set(cols)) != len(cols):
+            dupes = sorted({col for col in cols if cols.count(col) > 1})
+            raise ValueError(f'mysql: duplicate column names in result {dupes}')
+
+        # one list per column, rather than one dict per row.
+        if not rows:
+            return {col: [] for col in cols}
+
+        return {col: list(vals) for col, vals in zip(cols, zip(*rows))}
+
     async def iterall(
         self, query: str,
         params: SQLParams = [],
         _dict: bool = True
     ) -> AsyncGenerator[Union[DictSQLResult, TupleSQLResult], None]:
-        """Like fetchall, but returns an async generator."""
-        cursor_type = (aiomysql.DictCursor if _dict else
-                       aiomysql.Cursor)
+        """Like fetchall, but returns an async generator.
+
+           Always uses its own connection from the pool, even within
+           connection(), so this requires a free connection in the pool."""
+        # use unbuffered (server-side) cursors, so rows are
+        # streamed as they're iterated rather than all at once.
+        cursor_type = (aiomysql.SSDictCursor if _dict else
+                       aiomysql.SSCursor)
 
+        # always on its own connection; the result is read from the
+        # connection as it's iterated, so no other queries can use it.
         async with self.pool.acquire() as conn:
             async with conn.cursor(cursor_type) as cur:
                 await cur.execute(query, params)
@@ -94,21 +198,36 @@ class AsyncSQLPool:
 # NOTE: i don't really use this anymore
 class SQLPool(mysql.connector.pooling.MySQLConnectionPool):
     """A thin wrapper around a mysql pool for single query connections."""
+    @contextmanager
+    def connection(self) -> Iterator[PooledMySQLConnection]:
+        """Acquire a connection, to be used by all queries within the context."""
+        if (cnx := _pinned_cnxs.get().get(self)) is not None:
+            # already pinned by an outer context.
+            yield cnx
+            return
+
+        if not (cnx := self.get_connection()):
+            raise Exception('mysql: failed to retrieve a worker for cmyui.connection()')
+
+        token = _pinned_cnxs.set({**_pinned_cnxs.get(), self: cnx})
+        try:
+            yield cnx
+        finally:
+            _pinned_cnxs.reset(token)
+            cnx.close() # return to pool
+
     def execute(self, query: str, params: SQLParams = []) -> int:
         """Acquire a connection & execute a given querystring."""
-        if not (cnx := self.get_connection()):
-            raise Exception('mysql: failed to retrieve a worker for cmyui.execute()')
+        with self.connection() as cnx:
+            cur = cnx.cursor()
+            cur.execute(query, params)
 
-        cur = cnx.cursor()
-        cur.execute(query, params)
-        cur.fetchmany()
+            # Since we are executing a command, we
+            # simply return the last row affected's id.
+            res = cur.lastrowid
 
-        # Since we are executing a command, we
-        # simply return the last row affected's id.
-        res = cur.lastrowid
+            cur.close()
 
-        cur.close()
-        cnx.close()
         return res
 
     def fetch(
@@ -119,17 +238,20 @@ class SQLPool(mysql.connector.pooling.MySQLConnectionPool):
     ) -> Union[DictSQLResult, TupleSQLResult]:
         """Acquire a connection & fetch first result
            row for a given querystring."""
-        if not (cnx := self.conn.get_connection()):
-            raise Exception('mysql: failed to retrieve a worker for cmyui.fetch()')
+        with self.connection() as cnx:
+            # fetchall() reads the whole result itself, so only buffer
+            # the result when a single row is fetched (to discard the rest).
+            cur = cnx.cursor(dictionary=_dict, buffered=not _all)
+            cur.execute(query, params)
 
-        cur = cnx.cursor(dictionary=_dict, buffered=True)
-        cur.execute(query, params)
+            # We are fetching data.
+            if _all:
+                res = cur.fetchall()
+            else:
+                res = cur.fetchone()
 
-        # We are fetching data.
-        res = (cur.fetchall if _all else cur.fetchone)()
+            cur.close()
 
-        cur.close()
-        cnx.close()
         return res
 
     def fetchall(
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import time
 from typing import Any
 from typing import Optional
@@ -16,18 +17,33 @@ OSU_API_BASE = 'https://osu.ppy.sh/api/v2'
 # string and integral representations of gamemodes.
 API_GameMode = Union[str, int]
 
+_MODE_NAMES = ('osu', 'taiko', 'fruits', 'mania')
+_MODE_NAME_SET = frozenset(_MODE_NAMES)
+
 class OsuAPIWrapper:
     def __init__(self, client_id: int, client_secret: str) -> None:
         self.client_id = client_id
         self.client_secret = client_secret
 
-        self.access_token = {
-            'token': None,
-            'timeout': 0
+        self._token: Optional[str] = None
+        self._token_expiry = 0.0 # time.monotonic()
+
+    @property
+    def access_token(self) -> dict[str, Any]:
+        """The current token & its (wall clock) expiry time."""
+        # the expiry is tracked monotonically, and 30 secs early.
+        timeout = time.time() + (self._token_expiry - time.monotonic()) + 30
+        return {
+            'token': self._token,
+            'timeout': timeout if self._token is not None else 0
         }
 
     async def __aenter__(self):
         self.http_sess = aiohttp.ClientSession(json_serialize=orjson.dumps)
+
+        # held while the token is refreshed, so concurrent
+        # requests near expiry only refresh it once.
+        self._auth_lock = asyncio.Lock()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
@@ -43,25 +59,33 @@ class OsuAPIWrapper:
             'scope': 'public'
         }
 
+        # don't send the expired token along to the oauth endpoint.
+        self.http_sess.headers.pop('Authorization', None)
+
         async with self.http_sess.post(url, data=params) as resp:
-            json = await resp.json()
+            json = orjson.loads(await resp.read())
 
-            self.access_token = {
-                'token': json['access_token'],
-                'timeout': time.time() + json['expires_in']
-            }
+            self._token = json['access_token']
+            # refresh a little early, so a request
+            # is never sent just as the token expires.
+            self._token_expiry = time.monotonic() + json['expires_in'] - 30
+
+        # set the token as a default header on the session,
+        # rather than building the headers for every request.
+        self.http_sess.headers['Authorization'] = f'Bearer {self._token}'
 
     async def _request(self, url: str, params: Optional[dict[str, Any]] = None) -> None:
         """Perform a request to the osu!api."""
         # check if oauth2 token is expired
-        if time.time() > self.access_token['timeout']:
-            await self._authorize()
-
-        headers = {'Authorization': f'Bearer {self.access_token["token"]}'}
+        if time.monotonic() > self._token_expiry:
+            async with self._auth_lock:
+                # it may have been refreshed while we waited.
+                if time.monotonic() > self._token_expiry:
+                    await self._authorize()
 
         # XXX: i don't think i need to support POST? will if needed
-        async with self.http_sess.get(url, params=params, headers=headers) as resp:
-            json = await resp.json()
+        async with self.http_sess.get(url, params=params) as resp:
+            json = orjson.loads(await resp.read())
 
         return json
 
@@ -74,14 +98,14 @@ class OsuAPIWrapper:
         # but the osu!api requires the string version.
         if mode is not None:
             if isinstance(mode, str):
-                if mode not in ('osu', 'taiko', 'fruits', 'mania'):
+                if mode not in _MODE_NAME_SET:
                     return
 
             elif isinstance(mode, int):
-                if not (0 < mode <= 3):
+                if not (0 <= mode <= 3):
                     return
 
-                mode = ('osu', 'taiko', 'fruits', 'mania')[mode]
+                mode = _MODE_NAMES[mode]
 
             url += f'/{mode}'
 
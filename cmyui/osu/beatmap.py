@@ -1,13 +1,16 @@
 """ Tools for working with osu!'s .osu file format """
 # -*- coding: utf-8 -*-
 
+import asyncio
 import os
+from array import array
 from enum import IntEnum
 from enum import IntFlag
 from enum import unique
-from functools import cache
-from functools import cached_property
+from itertools import chain
 from typing import Callable
+from typing import Collection
+from typing import Iterable
 from typing import NamedTuple
 from typing import Optional
 from typing import Union
@@ -36,7 +39,7 @@ StrOrBytesPath = Union[str, bytes, os.PathLike[str], os.PathLike[bytes]]
 class TimingPoint:
     __slots__ = (
         'time', 'beat_length', 'meter', 'sample_set', 'sample_index',
-        'volume', 'uninherited', 'effects', '__dict__'
+        'volume', 'uninherited', 'effects'
     )
 
     def __init__(
@@ -53,7 +56,7 @@ class TimingPoint:
         self.uninherited = uninherited
         self.effects = effects
 
-    @cached_property
+    @property
     def bpm(self) -> float:
         return 1 / self.beat_length * 1000 * 60
 
@@ -67,20 +70,22 @@ class TimingPoint:
 
         try: # TODO: find version with the change?
             if split_len == 8:
+                # unpacked in one go, rather than indexed field by field.
+                (time, beat_length, meter, sample_set,
+                 sample_index, volume, uninherited, effects) = tp_split
+
                 return cls(
-                    time=int(tp_split[0]),
-                    beat_length=float(tp_split[1]),
-                    meter=int(tp_split[2]),
-                    sample_set=int(tp_split[3]),
-                    sample_index=int(tp_split[4]),
-                    volume=int(tp_split[5]),
-                    uninherited=tp_split[6] == '1',
-                    effects=int(tp_split[7])
+                    int(time), float(beat_length), int(meter),
+                    int(sample_set), int(sample_index), int(volume),
+                    uninherited == '1', int(effects)
                 )
             elif split_len == 2:
+                # old format; only uninherited
+                # points, with default settings.
+                time, beat_length = tp_split
                 return cls(
-                    time=int(tp_split[0]),
-                    beat_length=float(tp_split[1])
+                    int(time), float(beat_length), 4,
+                    0, 0, 100, True, 0
                 )
         except ValueError:
             # failed to cast something
@@ -110,12 +115,21 @@ class HitSample:
         self.filename = filename
 
     @classmethod
-    @cache
-    def from_str(cls, s: str) -> 'HitSample':
+    def from_str(cls, s: str) -> Optional['HitSample']:
+        # maps only use a handful of distinct samples, so parsed
+        # samples are cached & shared between hit objects.
+        try:
+            return _hit_sample_cache[s]
+        except KeyError:
+            hit_sample = _hit_sample_cache[s] = cls._parse(s)
+            return hit_sample
+
+    @classmethod
+    def _parse(cls, s: str) -> Optional['HitSample']:
         if len(hs_split := s.split(':')) != 5:
             return
 
-        if all(map(str.isdecimal, hs_split[:-1])):
+        try:
             return cls(
                 normal_set=SampleSet(int(hs_split[0])),
                 addition_set=SampleSet(int(hs_split[1])),
@@ -123,6 +137,11 @@ class HitSample:
                 volume=int(hs_split[3]),
                 filename=hs_split[4]
             )
+        except ValueError:
+            # non-integral field, or an invalid sample set
+            return
+
+_hit_sample_cache: dict[str, Optional[HitSample]] = {}
 
 class ObjectType:
     HIT_CIRCLE = 1 << 0
@@ -146,6 +165,10 @@ class HitSound(IntFlag):
     def __str__(self) -> str:
         return self.name.lower()
 
+# there are only 16 valid combinations, so they're created once
+# up front rather than through IntFlag's constructor per hit object.
+_HIT_SOUNDS = tuple(HitSound(i) for i in range(16))
+
 class HitObject:
     __slots__ = ('x', 'y', 'time',
                  'child_tp', 'parent_tp',
@@ -176,32 +199,29 @@ class HitObject:
         self.hit_sound = hit_sound
         self.hit_sample = hit_sample
 
+    # by default, only the timing of the object's head is judged
+    # (i.e. a hit circle); other types of hit object override this,
+    # so there's no type checking to do when judging a replay.
     def determine_judgement(
         self,
         keypress_frame: ReplayFrame,
         hit_windows: dict[int, float]
     ) -> 'Judgement':
-        hit_error = keypress_frame.time - self.time
-
-        if isinstance(self, HitCircle):
-            if abs(hit_error) <= hit_windows[300]:
-                return Judgement300(self, keypress_frame)
-            elif abs(hit_error) <= hit_windows[100]:
-                return Judgement100(self, keypress_frame)
-            elif abs(hit_error) <= hit_windows[50]:
-                return Judgement50(self, keypress_frame)
-            else:
-                return JudgementMiss(self, keypress_frame)
-        elif isinstance(self, Slider): # TODO
-            return Judgement300(self, keypress_frame)
-        elif isinstance(self, Spinner): # TODO
+        hit_error = abs(keypress_frame.time - self.time)
+
+        if hit_error <= hit_windows[300]:
             return Judgement300(self, keypress_frame)
+        elif hit_error <= hit_windows[100]:
+            return Judgement100(self, keypress_frame)
+        elif hit_error <= hit_windows[50]:
+            return Judgement50(self, keypress_frame)
         else:
-            breakpoint()
-            print()
+            return JudgementMiss(self, keypress_frame)
 
 class Judgement:
     __slots__ = ('hitobj', 'keypress_frame', 'hit_error')
+    label = '' # coloured name, set by each judgement
+
     def __init__(self, hitobj: HitObject,
                  keypress_frame: ReplayFrame) -> None:
         self.hitobj = hitobj
@@ -209,36 +229,42 @@ class Judgement:
 
         self.hit_error = keypress_frame.time - hitobj.time
 
-class Judgement300(Judgement):
     def __repr__(self) -> str:
-        return (f'{logging.Ansi.LCYAN!r}300{logging.Ansi.RESET!r} on {self.hitobj} - '
+        return (f'{self.label} on {self.hitobj} - '
                 f'{{{self.keypress_frame.x:.2f} {self.keypress_frame.y:.2f}}}')
+
+# NOTE: the subclasses must define (empty) slots
+# too, otherwise each instance would get a __dict__.
+class Judgement300(Judgement):
+    __slots__ = ()
+    label = f'{logging.Ansi.LCYAN!r}300{logging.Ansi.RESET!r}'
 class Judgement100(Judgement):
-    def __repr__(self) -> str:
-        return (f'{logging.Ansi.LGREEN!r}100{logging.Ansi.RESET!r} on {self.hitobj} - '
-                f'{{{self.keypress_frame.x:.2f} {self.keypress_frame.y:.2f}}}')
+    __slots__ = ()
+    label = f'{logging.Ansi.LGREEN!r}100{logging.Ansi.RESET!r}'
 class Judgement50(Judgement):
-    def __repr__(self) -> str:
-        return (f'{logging.Ansi.LMAGENTA!r}50{logging.Ansi.RESET!r} on {self.hitobj} - '
-                f'{{{self.keypress_frame.x:.2f} {self.keypress_frame.y:.2f}}}')
+    __slots__ = ()
+    label = f'{logging.Ansi.LMAGENTA!r}50{logging.Ansi.RESET!r}'
 class JudgementMiss(Judgement):
-    def __repr__(self) -> str:
-        return (f'{logging.Ansi.LRED!r}Miss{logging.Ansi.RESET!r} on {self.hitobj} - '
-                f'{{{self.keypress_frame.x:.2f} {self.keypress_frame.y:.2f}}}')
+    __slots__ = ()
+    label = f'{logging.Ansi.LRED!r}Miss{logging.Ansi.RESET!r}'
 
 class HitCircle(HitObject):
     # hitcircle is simple, nothing extra,
     # so we don't have to write constructor
+    # (but we do need empty slots, to not get a __dict__)
+    __slots__ = ()
 
     def __repr__(self) -> str:
         return f'Circle @ {{{self.x} {self.y}}}'
 
     @classmethod
-    def from_str(cls, s: str, **kwargs):
-        if s != '0:0:0:0:':
-            kwargs['hit_sample'] = HitSample.from_str(s)
-
-        return cls(**kwargs)
+    def from_str(
+        cls, s: str, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound
+    ) -> 'HitCircle':
+        hit_sample = HitSample.from_str(s) if s != '0:0:0:0:' else None
+        return cls(x, y, time, child_tp, parent_tp, hit_sound, hit_sample)
 
 @unique
 class CurveType(IntEnum):
@@ -248,113 +274,240 @@ class CurveType(IntEnum):
     Perfect = 3
 
     @staticmethod
-    @cache
     def from_str(s: str) -> 'CurveType':
-        return {
-            'B': CurveType.Bezier, 'C': CurveType.Catmull,
-            'L': CurveType.Linear, 'P': CurveType.Perfect
-        }[s]
+        return _CURVE_TYPES[s]
 
     #def __str__(self) -> str:
     #    # first char of character
     #    return self.name[0]
 
+_CURVE_TYPES = {
+    'B': CurveType.Bezier, 'C': CurveType.Catmull,
+    'L': CurveType.Linear, 'P': CurveType.Perfect
+}
+
 class Slider(HitObject):
     __slots__ = (
-        'curve_type', 'curve_points', 'slides',
-        'length', 'edge_sounds', 'edge_sets'
+        'curve_type', 'curve_points_flat', 'slides',
+        'length', 'edge_sounds', 'edge_sets_flat'
     )
 
     def __init__(
-        self, curve_type: CurveType,
-        curve_points: list[tuple[int, int]],
+        self, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound,
+        curve_type: CurveType,
+        curve_points: Union[list[tuple[int, int]], array],
         slides: int,
         length: float,
-        edge_sounds: list[int] = [],
-        edge_sets: list[list[int, int]] = [],
-        **kwargs
+        edge_sounds: Optional[Union[list[int], array]] = None,
+        edge_sets: Optional[Union[list[tuple[int, int]], array]] = None,
+        hit_sample: Optional[HitSample] = None
     ) -> None:
         self.curve_type = curve_type
         self.curve_points = curve_points
         self.slides = slides
         self.length = length
+        if edge_sounds is None:
+            edge_sounds = array('i')
+        elif not isinstance(edge_sounds, array):
+            edge_sounds = array('i', edge_sounds)
+
         self.edge_sounds = edge_sounds
-        self.edge_sets = edge_sets
+        self.edge_sets = edge_sets if edge_sets is not None else array('i')
 
-        super().__init__(**kwargs)
+        super().__init__(x, y, time, child_tp, parent_tp,
+                         hit_sound, hit_sample)
 
     def __repr__(self) -> str:
         return f'Slider [{self.curve_type.name}] @ {{{self.x} {self.y}}}'
 
+    # curve points are stored flat in an int array (x0, y0, x1, y1, ...),
+    # rather than as a list of tuples, which is ~10x larger in memory.
+    @property
+    def curve_points(self) -> list[tuple[int, int]]:
+        """A new list of the curve's (x, y) points.
+
+           This is a copy; modifying it won't affect the slider (assign
+           to it, or modify `curve_points_flat`, to change the points)."""
+        points = self.curve_points_flat
+        return list(zip(points[0::2], points[1::2]))
+
+    @curve_points.setter
+    def curve_points(self, points: Union[list[tuple[int, int]], array]) -> None:
+        if not isinstance(points, array):
+            points = array('i', chain.from_iterable(points))
+
+        self.curve_points_flat = points
+
+    # edge sets are stored flat in the same way (normal0, addition0, ...).
+    @property
+    def edge_sets(self) -> list[tuple[int, int]]:
+        """A new list of the edges' (normal, addition) sample sets.
+
+           This is a copy; modifying it won't affect the slider (assign
+           to it, or modify `edge_sets_flat`, to change the sets)."""
+        sets = self.edge_sets_flat
+        return list(zip(sets[0::2], sets[1::2]))
+
+    @edge_sets.setter
+    def edge_sets(self, sets: Union[list[tuple[int, int]], array]) -> None:
+        if not isinstance(sets, array):
+            sets = array('i', chain.from_iterable(sets))
+
+        self.edge_sets_flat = sets
+
+    def determine_judgement(
+        self,
+        keypress_frame: ReplayFrame,
+        hit_windows: dict[int, float]
+    ) -> 'Judgement':
+        return Judgement300(self, keypress_frame) # TODO
+
     @classmethod
-    def from_str(cls, s: str, **kwargs):
+    def from_str(
+        cls, s: str, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound
+    ) -> Optional['Slider']:
         if len(split := s.split(',')) < 3:
             return
 
         _curve, _slides, _slen, *_extra = split
-        ctype, cpoints = _curve.split('|', 1)
-
-        if _extra:
-            assert len(_extra) == 3
-            kwargs['edge_sounds'] = list(map(int, _extra[0].split('|')))
-            kwargs['edge_sets'] = [x.split(':', 1) for x in _extra[1].split('|')]
-            kwargs['hit_sample'] = HitSample.from_str(_extra[2])
-
-        curve_points = []
-        for entry in cpoints.split('|'):
-            split = entry.split(':', maxsplit=1)
-            curve_points.append((int(split[0]), int(split[1])))
-
-        return cls(
-            curve_type=CurveType.from_str(ctype),
-            curve_points=curve_points,
-            slides=int(_slides),
-            length=float(_slen),
-            **kwargs
-        )
+
+        if _extra and len(_extra) != 3:
+            return
+
+        try:
+            ctype, cpoints = _curve.split('|', 1)
+
+            if _extra:
+                edge_sounds = array('i', map(int, _extra[0].split('|')))
+
+                # n:a|n:a|... -> flat array of [n, a, n, a, ...]
+                edge_sets = array('i', map(int, _extra[1].replace(':', '|').split('|')))
+                if len(edge_sets) % 2:
+                    return
+
+                hit_sample = HitSample.from_str(_extra[2])
+            else:
+                edge_sounds = array('i')
+                edge_sets = array('i')
+                hit_sample = None
+
+            # x:y|x:y|... -> flat array of [x, y, x, y, ...]
+            curve_points = array('i', map(int, cpoints.replace(':', '|').split('|')))
+            if len(curve_points) % 2:
+                return
+
+            return cls(
+                x, y, time, child_tp, parent_tp, hit_sound,
+                CurveType.from_str(ctype), curve_points,
+                int(_slides), float(_slen),
+                edge_sounds, edge_sets, hit_sample
+            )
+        except (ValueError, OverflowError, KeyError):
+            # malformed field, a value out of an int's range,
+            # or an unknown curve type.
+            return
 
 class Spinner(HitObject):
     __slots__ = ('end_time',)
 
-    def __init__(self, end_time: int, **kwargs) -> None:
+    def __init__(
+        self, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound, end_time: int,
+        hit_sample: Optional[HitSample] = None
+    ) -> None:
         self.end_time = end_time
 
-        super().__init__(**kwargs)
+        super().__init__(x, y, time, child_tp, parent_tp,
+                         hit_sound, hit_sample)
+
+    def determine_judgement(
+        self,
+        keypress_frame: ReplayFrame,
+        hit_windows: dict[int, float]
+    ) -> 'Judgement':
+        return Judgement300(self, keypress_frame) # TODO
 
     @classmethod
-    def from_str(cls, s, **kwargs):
+    def from_str(
+        cls, s: str, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound
+    ) -> Optional['Spinner']:
         if len(split := s.split(',')) != 2:
             return
 
-        if split[0].isdecimal():
-            if split[1] != '0:0:0:0:':
-                kwargs['hit_sample'] = HitSample.from_str(split[1])
+        end_time, hit_sample = split
+
+        if end_time.isdecimal():
+            hit_sample = (HitSample.from_str(hit_sample)
+                          if hit_sample != '0:0:0:0:' else None)
 
-            return cls(end_time=int(split[0]), **kwargs)
+            return cls(x, y, time, child_tp, parent_tp,
+                       hit_sound, int(end_time), hit_sample)
 
 class ManiaHold(HitObject):
     __slots__ = ('end_time',)
 
-    def __init__(self, end_time: int, **kwargs) -> None:
+    def __init__(
+        self, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound, end_time: int,
+        hit_sample: Optional[HitSample] = None
+    ) -> None:
         self.end_time = end_time
 
-        super().__init__(**kwargs)
+        super().__init__(x, y, time, child_tp, parent_tp,
+                         hit_sound, hit_sample)
 
         # `self.x` determines the column the hold will be in;
         # it can be determined with floor(x * columnCount / 512)
         # clamped between 0 and columnCount - 1
         # y will default to the centre of playfield, 192
 
+    def determine_judgement(
+        self,
+        keypress_frame: ReplayFrame,
+        hit_windows: dict[int, float]
+    ) -> 'Judgement':
+        return Judgement300(self, keypress_frame) # TODO
+
     @classmethod
-    def from_str(cls, s, **kwargs):
-        if len(split := s.split(':')) != 2:
+    def from_str(
+        cls, s: str, x: int, y: int, time: int,
+        child_tp: TimingPoint, parent_tp: TimingPoint,
+        hit_sound: HitSound
+    ) -> Optional['ManiaHold']:
+        # endTime:hitSample, where the hit sample also contains colons.
+        if len(split := s.split(':', 1)) != 2:
             return
 
-        if split[0].isdecimal():
-            if split[1] != '0:0:0:0:':
-                kwargs['hit_sample'] = HitSample.from_str(split[1])
+        end_time, hit_sample = split
 
-            return cls(end_time=int(split[0]), **kwargs)
+        if end_time.isdecimal():
+            hit_sample = (HitSample.from_str(hit_sample)
+                          if hit_sample != '0:0:0:0:' else None)
+
+            return cls(x, y, time, child_tp, parent_tp,
+                       hit_sound, int(end_time), hit_sample)
+
+def _hit_object_class(t: int) -> Optional[type[HitObject]]:
+    if t & ObjectType.HIT_CIRCLE:
+        return HitCircle
+    elif t & ObjectType.SLIDER:
+        return Slider
+    elif t & ObjectType.SPINNER:
+        return Spinner
+    elif t & ObjectType.MANIA_HOLD:
+        return ManiaHold
+
+# the hit object class for each value of the type's
+# (8-bit) bitfield, so it can be found with a single index.
+_HIT_OBJECT_CLASSES = tuple(_hit_object_class(t) for t in range(256))
 
 class Colour(NamedTuple):
     r: int
@@ -366,12 +519,14 @@ class Colour(NamedTuple):
         if len(split := s.split(',')) != 3:
             return
 
-        if all(map(str.isdecimal, split)):
+        try:
             return cls(
                 r=int(split[0]),
                 g=int(split[1]),
                 b=int(split[2])
             )
+        except ValueError:
+            return
 
 @unique
 class OverlayPosition(IntEnum):
@@ -393,20 +548,12 @@ class Event:
             return
 
         if split[1].isdecimal():
-            # a bit unsafe but w/e
-            _type = split[0]
-
-            if _type.isdecimal():
-                ev_map = (Background, Video, Break)
-                _type = int(_type)
-            else:
-                ev_map = {'Video': Video, 'Break': Break}
-
-            if _type in ev_map:
-                cls = ev_map[_type]
+            # event types may be given by number or name
+            if (cls := _EVENT_TYPES.get(split[0])) is not None:
                 return cls.from_str(split[2], start_time=int(split[1]))
 
-class Background(Event):
+class _MediaEvent(Event):
+    """An event displaying a file (backgrounds & videos)."""
     __slots__ = ('filename', 'x_offset', 'y_offset')
 
     def __init__(
@@ -434,46 +581,17 @@ class Background(Event):
             kwargs['x_offset'] = int(x_off)
             kwargs['y_offset'] = int(y_off)
         elif lsplit != 1:
-            raise Exception('Invalid arg count for a background.')
+            raise Exception(f'Invalid arg count for a {cls.__name__.lower()}.')
 
         kwargs['filename'] = split[0].strip('"')
 
         return cls(**kwargs)
 
-# TODO: this is the exact same as Background lol
-class Video(Event):
-    __slots__ = ('filename', 'x_offset', 'y_offset')
-
-    def __init__(
-        self, filename: str,
-        x_offset: Optional[int] = None,
-        y_offset: Optional[int] = None,
-        **kwargs
-    ) -> None:
-        self.filename = filename
-        self.x_offset = x_offset
-        self.y_offset = y_offset
-
-        super().__init__(**kwargs)
-
-    @classmethod
-    def from_str(cls, s: str, **kwargs):
-        split = s.split(',', 2)
-        lsplit = len(split)
-
-        if lsplit == 3:
-            x_off, y_off = split[1:3]
-            if not (x_off.isdecimal() and y_off.isdecimal()):
-                return
+class Background(_MediaEvent):
+    __slots__ = ()
 
-            kwargs['x_offset'] = int(x_off)
-            kwargs['y_offset'] = int(y_off)
-        elif lsplit != 1:
-            raise Exception('Invalid arg count for a background.')
-
-        kwargs['filename'] = split[0].strip('"')
-
-        return cls(**kwargs)
+class Video(_MediaEvent):
+    __slots__ = ()
 
 class Break(Event):
     __slots__ = ('end_time',)
@@ -488,8 +606,111 @@ class Break(Event):
         if s.isdecimal():
             return cls(end_time=int(s), **kwargs)
 
+_EVENT_TYPES = {
+    '0': Background,
+    '1': Video, 'Video': Video,
+    '2': Break, 'Break': Break
+}
+
 # TODO: storyboards?
 
+# parsers for the values of [General], [Editor], [Metadata] & [Difficulty]
+# keys; they return `None` for invalid values, which are then skipped.
+# int() & float() alone would also accept things like
+# '1_000', ' 1', '1e3', 'nan' & 'inf'; only plain digits
+# (with an optional sign & decimal point) are valid here.
+def _parse_int(s: str) -> Optional[int]:
+    if utils._isdecimal(s, _negative=True):
+        try:
+            return int(s)
+        except ValueError: # misplaced '-'
+            return
+
+def _parse_float(s: str) -> Optional[float]:
+    if utils._isdecimal(s, _float=True, _negative=True):
+        try:
+            return float(s)
+        except ValueError: # misplaced '-'
+            return
+
+def _parse_bool(s: str) -> bool:
+    return s == '1'
+
+def _parse_tags(s: str) -> list[str]:
+    return s.split(' ')
+
+def _parse_int_list(s: str) -> Optional[list[int]]:
+    try:
+        return list(map(int, s.split(',')))
+    except ValueError:
+        return
+
+_SAMPLE_SETS = {
+    'Normal': SampleSet.NORMAL,
+    'Soft': SampleSet.SOFT,
+    'Drum': SampleSet.DRUM
+}
+
+_OVERLAY_POSITIONS = {
+    'NoChange': OverlayPosition.No_Change,
+    'Below': OverlayPosition.Below,
+    'Above': OverlayPosition.Above
+}
+
+# {key: (attribute name, value parser)}
+_GENERAL_KEYS = {
+    'AudioFilename': ('audio_filename', str),
+    'AudioLeadIn': ('audio_leadin', _parse_int),
+    #'AudioHash': ('audio_hash', str), # deprecated
+    'PreviewTime': ('preview_time', _parse_int),
+    'Countdown': ('countdown', _parse_int),
+    'SampleSet': ('sample_set', _SAMPLE_SETS.get),
+    'StackLeniency': ('stack_leniency', _parse_float),
+    'Mode': ('mode', _parse_int),
+    'LetterboxInBreaks': ('letterbox_in_breaks', _parse_bool),
+    #'StoryFireInFront': ('story_fire_in_front', _parse_bool), # deprecated
+    'UseSkinSprites': ('use_skin_sprites', _parse_bool),
+    #'AlwaysShowPlayfield': ('always_show_playfield', _parse_bool), # deprecated
+    'OverlayPosition': ('overlay_position', _OVERLAY_POSITIONS.get),
+    'SkinPreference': ('skin_preference', str),
+    'EpilepsyWarning': ('epilepsy_warning', _parse_bool),
+    'CountdownOffset': ('countdown_offset', _parse_int),
+    'SpecialStyle': ('special_style', _parse_bool),
+    'WidescreenStoryboard': ('widescreen_storyboard', _parse_bool),
+    'SamplesMatchPlaybackRate': ('samples_match_playback_rate', _parse_bool)
+}
+
+_EDITOR_KEYS = {
+    'Bookmarks': ('bookmarks', _parse_int_list),
+    'DistanceSpacing': ('distance_spacing', _parse_float),
+    'BeatDivisor': ('beat_divisor', _parse_float),
+    'GridSize': ('grid_size', _parse_int),
+    'TimelineZoom': ('timeline_zoom', _parse_float)
+}
+
+_METADATA_KEYS = {
+    'Title': ('title', str),
+    'TitleUnicode': ('title_unicode', str),
+    'Artist': ('artist', str),
+    'ArtistUnicode': ('artist_unicode', str),
+    'Creator': ('creator', str),
+    'Version': ('version', str),
+    'Source': ('source', str),
+    'Tags': ('tags', _parse_tags),
+    'BeatmapID': ('id', _parse_int),
+    'BeatmapSetID': ('set_id', _parse_int)
+}
+
+# all difficulty values are floats
+_DIFFICULTY_KEYS = {
+    'HPDrainRate': ('diff_hp', _parse_float),
+    'CircleSize': ('diff_cs', _parse_float),
+    'OverallDifficulty': ('diff_od', _parse_float),
+    'ApproachRate': ('diff_ar', _parse_float),
+    'SliderMultiplier': ('slider_multiplier', _parse_float),
+    'SliderTickRate': ('slider_tick_rate', _parse_float)
+}
+
 class Beatmap:
     __slots__ = (
         'file_version', 'audio_filename', 'audio_leadin',
@@ -587,9 +808,17 @@ class Beatmap:
         return self._data[self._offset:]
 
     @classmethod
-    def from_data(cls, data: str) -> Optional['Beatmap']:
+    def from_data(
+        cls, data: str,
+        sections: Optional[Collection[str]] = None
+    ) -> Optional['Beatmap']:
+        """Parse a beatmap from the contents of a .osu file.
+
+           If `sections` is passed, only the sections named within
+           it (e.g. {'Metadata', 'Difficulty'}) will be parsed; the
+           attributes of any others will be left as `None`."""
         b = cls(data)
-        b._parse()
+        b._parse(sections)
 
         if b.file_version is None:
             # failed to parse the map.
@@ -599,22 +828,47 @@ class Beatmap:
         return b
 
     @classmethod
-    def from_file(cls, path: StrOrBytesPath) -> Optional['Beatmap']:
+    def from_file(
+        cls, path: StrOrBytesPath,
+        sections: Optional[Collection[str]] = None
+    ) -> Optional['Beatmap']:
         if os.path.exists(path):
-            with open(path, 'r') as f:
-                return Beatmap.from_data(f.read())
+            # .osu files are utf-8, sometimes with a bom (which
+            # utf-8-sig drops), and often crlf (which text mode's
+            # universal newlines will handle).
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                return cls.from_data(f.read(), sections)
 
-    def _parse(self) -> None:
-        sec_start = self.data.find('\n\n')
+    @classmethod
+    async def from_files(
+        cls, paths: Iterable[StrOrBytesPath],
+        sections: Optional[Collection[str]] = None
+    ) -> list[Optional['Beatmap']]:
+        """Parse many beatmap files, with their reads overlapped.
+
+           Each file is read & parsed in the event loop's default
+           executor; the results are returned in the order of `paths`."""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(None, cls.from_file, path, sections)
+            for path in paths
+        ])
+
+    def _parse(self, sections: Optional[Collection[str]] = None) -> None:
+        sec_start = self._data.find('\n\n')
         self._offset += len('osu file format v')
 
-        ver_str = self.data[:sec_start - self._offset]
+        ver_str = self._data[self._offset:sec_start]
         if not ver_str.isdecimal():
             logging.log('Failed to parse version string.', logging.Ansi.LRED)
             return
 
         self.file_version = int(ver_str)
 
+        if sections is not None and 'HitObjects' in sections:
+            # hit objects are linked to their timing points.
+            sections = {*sections, 'TimingPoints'}
+
         for name, func in (
             ('General', self._parse_general),
             ('Editor', self._parse_editor),
@@ -625,7 +879,8 @@ class Beatmap:
             ('Colours', self._parse_colours),
             ('HitObjects', self._parse_hit_objects)
         ):
-            self._parse_section(name, func)
+            if sections is None or name in sections:
+                self._parse_section(name, func)
 
         # TODO
         # parsing file completed, now
@@ -638,7 +893,7 @@ class Beatmap:
         parse_method: Callable[['Beatmap'], None]
     ) -> None:
         to_find = f'\n\n[{name}]\n'
-        offs = self.data.find(to_find)
+        offs = self._data.find(to_find, self._offset)
 
         if offs == -1:
             # skip any sections not found - the beatmap
@@ -646,177 +901,65 @@ class Beatmap:
             # if not parsed from the file.
             return
 
-        self._offset += offs + len(to_find)
+        self._offset = offs + len(to_find)
         parse_method()
 
-    def _parse_general(self) -> None:
-        end_of_section = self.data.find('\n\n')
+    def _read_section(self) -> str:
+        """Read the rest of the current section, advancing the offset."""
+        # searched for from the offset, rather than through
+        # `self.data`, which would copy the rest of the file.
+        start = self._offset
+        end = self._data.find('\n\n', start)
 
-        for line in self.data[:end_of_section].splitlines():
-            key, val = line.split(':', maxsplit=1)
-            val = val.lstrip()
+        if end == -1:
+            # last section in the file
+            end = len(self._data)
 
-            # how should i clean this.. lol
-
-            if key == 'AudioFilename':
-                self.audio_filename = val
-            elif key == 'AudioLeadIn':
-                if val.isdecimal():
-                    self.audio_leadin = int(val)
-            # deprecated
-            #elif key == 'AudioHash':
-            #    self.audio_hash = val
-            elif key == 'PreviewTime':
-                if val.isdecimal():
-                    self.preview_time = int(val)
-            elif key == 'Countdown':
-                if val.isdecimal():
-                    self.countdown = int(val)
-            elif key == 'SampleSet':
-                if val in ('Normal', 'Soft', 'Drum'):
-                    self.sample_set = {
-                        'Normal': SampleSet.NORMAL,
-                        'Soft': SampleSet.SOFT,
-                        'Drum': SampleSet.DRUM
-                    }[val]
-            elif key == 'StackLeniency':
-                if utils._isdecimal(val, _float=True):
-                    self.stack_leniency = float(val)
-            elif key == 'Mode':
-                if val.isdecimal():
-                    self.mode = int(val)
-            elif key == 'LetterboxInBreaks':
-                self.letterbox_in_breaks = val == '1'
-            # deprecated
-            #elif key == 'StoryFireInFront':
-            #    self.story_fire_in_front = val == '1'
-            elif key == 'UseSkinSprites':
-                self.use_skin_sprites = val == '1'
-            # deprecated
-            #elif key == 'AlwaysShowPlayfield':
-            #    self.always_show_playfield = val == '1'
-            elif key == 'OverlayPosition':
-                if val in ('NoChange', 'Below', 'Above'):
-                    self.overlay_position = {
-                        'NoChange': OverlayPosition.No_Change,
-                        'Below': OverlayPosition.Below,
-                        'Above': OverlayPosition.Above
-                    }[val]
-            elif key == 'SkinPreference':
-                self.skin_preference = val
-            elif key == 'EpilepsyWarning':
-                self.epilepsy_warning = val == '1'
-            elif key == 'CountdownOffset':
-                if val.isdecimal():
-                    self.countdown_offset = int(val)
-            elif key == 'SpecialStyle':
-                self.special_style = val == '1'
-            elif key == 'WidescreenStoryboard':
-                self.widescreen_storyboard = val == '1'
-            elif key == 'SamplesMatchPlaybackRate':
-                self.samples_match_playback_rate = val == '1'
-            else:
-                logging.log(
-                    f'Unknown [General] key {key}',
-                    logging.Ansi.LYELLOW
-                )
+        self._offset = end
+        return self._data[start:end]
 
-        self._offset += end_of_section
+    def _parse_key_values(
+        self, section: str,
+        keys: dict[str, tuple[str, Callable[[str], object]]],
+        strip_values: bool = True
+    ) -> None:
+        """Parse a section of `key: value` lines into attributes."""
+        for line in self._read_section().splitlines():
+            if line.startswith('//'):
+                continue
 
-    def _parse_editor(self) -> None:
-        e_end = self.data.find('\n\n')
+            key, sep, val = line.partition(':')
 
-        for line in self.data[:e_end].splitlines():
-            key, val = line.split(':', maxsplit=1)
-            val = val.lstrip()
+            if not sep:
+                # not a key/value pair
+                continue
 
-            if key == 'Bookmarks':
-                bookmarks_str = val.split(',')
-                if all(map(str.isdecimal, bookmarks_str)):
-                    self.bookmarks = list(map(int, bookmarks_str))
-            elif key == 'DistanceSpacing':
-                if utils._isdecimal(val, _float=True):
-                    self.distance_spacing = float(val)
-            elif key == 'BeatDivisor':
-                if utils._isdecimal(val, _float=True):
-                    self.beat_divisor = float(val)
-            elif key == 'GridSize':
-                if val.isdecimal():
-                    self.grid_size = int(val)
-            elif key == 'TimelineZoom':
-                if utils._isdecimal(val, _float=True):
-                    self.timeline_zoom = float(val)
-            else:
+            if strip_values:
+                val = val.lstrip()
+
+            if (entry := keys.get(key)) is None:
                 logging.log(
-                    f'Unknown [Editor] key {key}',
+                    f'Unknown [{section}] key {key}',
                     logging.Ansi.LYELLOW
                 )
+                continue
 
-        self._offset += e_end
+            # parsers return `None` for invalid values
+            attr, parser = entry
+            if (val := parser(val)) is not None:
+                setattr(self, attr, val)
 
-    def _parse_metadata(self) -> None:
-        m_end = self.data.find('\n\n')
-
-        for line in self.data[:m_end].splitlines():
-            key, val = line.split(':', maxsplit=1)
-
-            if key == 'Title':
-                self.title = val
-            elif key == 'TitleUnicode':
-                self.title_unicode = val
-            elif key == 'Artist':
-                self.artist = val
-            elif key == 'ArtistUnicode':
-                self.artist_unicode = val
-            elif key == 'Creator':
-                self.creator = val
-            elif key == 'Version':
-                self.version = val
-            elif key == 'Source':
-                self.source = val
-            elif key == 'Tags':
-                self.tags = val.split(' ')
-            elif key == 'BeatmapID':
-                if val.isdecimal():
-                    self.id = int(val)
-            elif key == 'BeatmapSetID':
-                if val.isdecimal():
-                    self.set_id = int(val)
-            else:
-                logging.log(
-                    f'Unknown [Metadata] key {key}',
-                    logging.Ansi.LYELLOW
-                )
+    def _parse_general(self) -> None:
+        self._parse_key_values('General', _GENERAL_KEYS)
 
-        self._offset += m_end
+    def _parse_editor(self) -> None:
+        self._parse_key_values('Editor', _EDITOR_KEYS)
+
+    def _parse_metadata(self) -> None:
+        self._parse_key_values('Metadata', _METADATA_KEYS, strip_values=False)
 
     def _parse_difficulty(self) -> None:
-        d_end = self.data.find('\n\n')
-
-        for line in self.data[:d_end].splitlines():
-            key, val = line.split(':', maxsplit=1)
-
-            # all diff params should be float
-            if utils._isdecimal(val, _float=True):
-                if key == 'HPDrainRate':
-                    self.diff_hp = float(val)
-                elif key == 'CircleSize':
-                    self.diff_cs = float(val)
-                elif key == 'OverallDifficulty':
-                    self.diff_od = float(val)
-                elif key == 'ApproachRate':
-                    self.diff_ar = float(val)
-                elif key == 'SliderMultiplier':
-                    self.slider_multiplier = float(val)
-                elif key == 'SliderTickRate':
-                    self.slider_tick_rate = float(val)
-                else:
-                    logging.log(
-                        f'Unknown [Difficulty] key {key}',
-                        logging.Ansi.LYELLOW
-                    )
-
-        self._offset += d_end
+        self._parse_key_values('Difficulty', _DIFFICULTY_KEYS, strip_values=False)
 
     def _parse_events(self) -> None:
         self.backgrounds = []
@@ -825,52 +968,74 @@ class Beatmap:
 
         # this is actually events, backgrounds,
         # videos, breaks, and storyboards.. lol
-        ev_end = self.data.find('\n\n')
-
-        for line in self.data[:ev_end].splitlines():
-            if line[:2] == '//':
+        # (only the first three are supported)
+        appenders = {
+            Background: self.backgrounds.append,
+            Video: self.videos.append,
+            Break: self.breaks.append
+        }
+
+        # same as Event.from_str, but dispatched inline
+        # so we already know which list the event is for.
+        for line in self._read_section().splitlines():
+            if not line or line.startswith('//'):
+                # blank line or comment
                 continue
 
-            ev = Event.from_str(line)
+            if len(split := line.split(',', 2)) != 3:
+                continue
 
-            if ev is not None:
-                if isinstance(ev, Background):
-                    self.backgrounds.append(ev)
-                elif isinstance(ev, Video):
-                    self.videos.append(ev)
-                elif isinstance(ev, Break):
-                    self.breaks.append(ev)
+            ev_type, start_time, params = split
 
-        self._offset += ev_end
+            if (
+                start_time.isdecimal() and
+                (cls := _EVENT_TYPES.get(ev_type)) is not None and
+                (ev := cls.from_str(params, start_time=int(start_time))) is not None
+            ):
+                appenders[cls](ev)
 
     def _parse_timing_points(self) -> None:
         self.timing_points = []
+        timing_points_append = self.timing_points.append
+        tp_from_str = TimingPoint.from_str
 
-        # find the end of the timing points section
-        tp_end = self.data.find('\n\n')
+        # failures are reported once, after the loop,
+        # rather than once per line for broken maps.
+        failed = 0
+        first_failed = None
 
         # iterate through each line, parsing
         # the lines into timing point objects.
-        for line in self.data[:tp_end].splitlines():
-            if not (tp := TimingPoint.from_str(line)):
-                logging.printc(
-                    f'Failed to parse timing point? "{line}"',
-                    logging.Ansi.RED
-                )
+        for line in self._read_section().splitlines():
+            if line.startswith('//'):
+                continue
+
+            if not (tp := tp_from_str(line)):
+                if not failed:
+                    first_failed = line
+                failed += 1
                 continue
 
-            self.timing_points.append(tp)
+            timing_points_append(tp)
 
-        self._offset += tp_end
+        if failed:
+            logging.printc(
+                f'Failed to parse {failed} timing point(s)? "{first_failed}"',
+                logging.Ansi.RED
+            )
 
     def _parse_colours(self) -> None:
         self.colours = {}
 
-        # find the end of the colours section
-        cl_end = self.data.find('\n\n')
+        for line in self._read_section().splitlines():
+            if line.startswith('//'):
+                continue
+
+            key, sep, val = line.partition(':')
+
+            if not sep:
+                continue
 
-        for line in self.data[:cl_end].splitlines():
-            key, val = line.split(':', maxsplit=1)
             key = key.rstrip()
             val = val.lstrip()
 
@@ -878,61 +1043,81 @@ class Beatmap:
                 # add to beatmap's colours
                 self.colours[key] = colour
 
-        self._offset += cl_end
-
     def _parse_hit_objects(self) -> None:
         self.hit_objects = []
 
-        parent_tp = self.timing_points[0]
-        child_tp = self.timing_points[0]
+        # this loop runs once per hit object, so
+        # keep everything it touches in locals.
+        hit_objects_append = self.hit_objects.append
+        hit_object_classes = _HIT_OBJECT_CLASSES
+        hit_sounds = _HIT_SOUNDS
+        timing_points = self.timing_points
+        num_timing_points = len(timing_points)
+        inf = float('inf')
+        unknown_types = set()
+
+        parent_tp = timing_points[0]
+        child_tp = timing_points[0]
         next_tp_index = 1
 
+        # time of the next timing point,
+        # or infinity once they've all been passed.
+        next_tp_time = (timing_points[1].time if num_timing_points > 1 else
+                        inf)
+
+        # hit objects are the last section; read until the end of the file.
+        data = self._data[self._offset:]
+        self._offset = len(self._data)
+
         # iterate through each line, parsing
         # the lines into hit object objects
-        for line in self.data.splitlines():
-            if not (
-                len(args := line.split(',', 5)) == 6 and
-                all(map(str.isdecimal, args[:-1]))
-            ):
+        for line in data.splitlines():
+            if len(args := line.split(',', 5)) != 6:
                 continue
 
-            t = int(args[3])
-
-            if t & ObjectType.HIT_CIRCLE:
-                cls = HitCircle
-            elif t & ObjectType.SLIDER:
-                cls = Slider
-            elif t & ObjectType.SPINNER:
-                cls = Spinner
-            elif t & ObjectType.MANIA_HOLD:
-                cls = ManiaHold
-            else:
-                logging.log(
-                    f'Unknown hit obj type {t}',
-                    logging.Ansi.LYELLOW
-                )
+            x, y, time, t, hit_sound, extras = args
+
+            # converting directly is cheaper than validating
+            # each field first, since failures are very rare.
+            try:
+                x = int(x)
+                y = int(y)
+                time = int(time)
+                t = int(t)
+                hit_sound = int(hit_sound)
+            except ValueError:
                 continue
 
-            time = int(args[2])
+            if (cls := hit_object_classes[t & 0xff]) is None:
+                unknown_types.add(t)
+                continue
 
-            while time >= self.timing_points[next_tp_index].time:
-                child_tp = self.timing_points[next_tp_index]
+            while time >= next_tp_time:
+                child_tp = timing_points[next_tp_index]
                 if child_tp.uninherited:
                     parent_tp = child_tp
+
                 next_tp_index += 1
+                next_tp_time = (timing_points[next_tp_index].time
+                                if next_tp_index < num_timing_points else
+                                inf)
 
+            # passed positionally, to avoid building (and
+            # unpacking) a kwargs dict for every object.
             obj = cls.from_str(
-                s=args[5],
-                x=int(args[0]),
-                y=int(args[1]),
-                time=time,
-                hit_sound=HitSound(int(args[4])),
-                parent_tp=parent_tp,
-                child_tp=child_tp
+                extras, x, y, time, child_tp, parent_tp,
+                (hit_sounds[hit_sound] if 0 <= hit_sound < 16 else
+                 HitSound(hit_sound))
             )
-            self.hit_objects.append(obj)
 
-        self._offset += len(self.data)
+            if obj is not None:
+                hit_objects_append(obj)
+
+        if unknown_types:
+            logging.log(
+                f'Unknown hit obj type(s) {sorted(unknown_types)}',
+                logging.Ansi.LYELLOW
+            )
 
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.realpath(__file__)))
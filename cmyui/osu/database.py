@@ -6,6 +6,7 @@
 import os
 import struct
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 from typing import Union
 
@@ -15,6 +16,18 @@ __all__ = ('BeatmapsDatabase', 'CollectionsDatabase', 'ScoresDatabase')
 
 StrOrBytesPath = Union[str, bytes, os.PathLike[str], os.PathLike[bytes]]
 
+# precompiled structs for the fixed-size types,
+# so the format isn't re-parsed on every read.
+_F16 = struct.Struct('<e')
+_F32 = struct.Struct('<f')
+_F64 = struct.Struct('<d')
+_TIMING_POINT = struct.Struct('<ddb') # bpm, offset, uninherited
+
+@lru_cache(maxsize=64)
+def _u32_list_struct(length: int) -> struct.Struct:
+    """Get a (cached) struct for a list of `length` u32s."""
+    return struct.Struct(f'<{length}I')
+
 # TODO: this can be moved and used for other
 # stuff like replay parsing & even bancho stuff
 class osuReader:
@@ -65,17 +78,17 @@ class osuReader:
     # floating-point types
 
     def read_f16(self) -> float:
-        val, = struct.unpack_from('<e', self.body_view[:2])
+        val, = _F16.unpack_from(self.body_view)
         self.body_view = self.body_view[2:]
         return val
 
     def read_f32(self) -> float:
-        val, = struct.unpack_from('<f', self.body_view[:4])
+        val, = _F32.unpack_from(self.body_view)
         self.body_view = self.body_view[4:]
         return val
 
     def read_f64(self) -> float:
-        val, = struct.unpack_from('<d', self.body_view[:8])
+        val, = _F64.unpack_from(self.body_view)
         self.body_view = self.body_view[8:]
         return val
 
@@ -87,7 +100,7 @@ class osuReader:
         length = int.from_bytes(self.body_view[:2], 'little')
         self.body_view = self.body_view[2:]
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[:length * 4])
+        val = _u32_list_struct(length).unpack_from(self.body_view)
         self.body_view = self.body_view[length * 4:]
         return val
 
@@ -95,7 +108,7 @@ class osuReader:
         length = int.from_bytes(self.body_view[:4], 'little')
         self.body_view = self.body_view[4:]
 
-        val = struct.unpack(f'<{"I" * length}', self.body_view[:length * 4])
+        val = _u32_list_struct(length).unpack_from(self.body_view)
         self.body_view = self.body_view[length * 4:]
         return val
 
@@ -254,6 +267,16 @@ class BeatmapsDatabase(osuDatabase):
         uninherited = self.read_i8()
         return BeatmapsDatabaseTimingPoint(bpm, offset, uninherited)
 
+    def read_timing_points(self) -> list[BeatmapsDatabaseTimingPoint]:
+        """Read a list of timing points with a single bulk unpack."""
+        size = self.read_i32() * _TIMING_POINT.size
+        timing_points = [
+            BeatmapsDatabaseTimingPoint(*tp)
+            for tp in _TIMING_POINT.iter_unpack(self.body_view[:size])
+        ]
+        self.body_view = self.body_view[size:]
+        return timing_points
+
     def read_star_rating_pair(self) -> tuple[int, float]:
         assert self.read_i8() == 0x08
         val1 = Mods(self.read_i32())
@@ -299,8 +322,7 @@ class BeatmapsDatabase(osuDatabase):
         drain_time = self.read_i32()
         total_time = self.read_i32()
         audio_preview = self.read_i32()
-        timing_points = [self.read_timing_point()
-                         for _ in range(self.read_i32())]
+        timing_points = self.read_timing_points()
         map_id = self.read_i32()
         set_id = self.read_i32()
         thread_id = self.read_i32()
@@ -39,6 +39,15 @@ wrote it with the same style as the beatmap parser.
 
 StrOrBytesPath = Union[str, bytes, os.PathLike[str], os.PathLike[bytes]]
 
+# precompiled structs for the fixed-size types,
+# so the format isn't re-parsed on every read.
+_I16 = struct.Struct('<h')
+_I32 = struct.Struct('<i')
+_I64 = struct.Struct('<q')
+_F32 = struct.Struct('<f')
+_F64 = struct.Struct('<d')
+_FRAME = struct.Struct('<iffB') # delta, x, y, keys
+
 class Keys:
     M1 = 1 << 0
     M2 = 1 << 1
@@ -60,12 +69,7 @@ class ReplayFrame:
 
     @property
     def as_bytes(self) -> bytes:
-        buf = bytearray()
-        buf.extend(self.delta.to_bytes(4, 'little', signed=True))
-        buf.extend(struct.pack('<ff', self.x, self.y))
-        buf.append(self.keys)
-
-        return bytes(buf)
+        return _FRAME.pack(self.delta, self.x, self.y, self.keys)
 
     @property
     def as_str(self) -> str:
@@ -203,27 +207,27 @@ class Replay:
         return val
 
     def _read_short(self) -> int:
-        val, = struct.unpack('<h', self.data[:2])
+        val, = _I16.unpack_from(self._data, self._offset)
         self._offset += 2
         return val
 
     def _read_int(self) -> int:
-        val, = struct.unpack('<i', self.data[:4])
+        val, = _I32.unpack_from(self._data, self._offset)
         self._offset += 4
         return val
 
     def _read_long(self) -> int:
-        val, = struct.unpack('<q', self.data[:8])
+        val, = _I64.unpack_from(self._data, self._offset)
         self._offset += 8
         return val
 
     def _read_float(self) -> float:
-        val, = struct.unpack('<f', self.data[:4])
+        val, = _F32.unpack_from(self._data, self._offset)
         self._offset += 4
         return val
 
     def _read_double(self) -> float:
-        val, = struct.unpack('<d', self.data[:8])
+        val, = _F64.unpack_from(self._data, self._offset)
         self._offset += 8
         return val
 
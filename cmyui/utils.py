@@ -143,16 +143,36 @@ def timef(f: Callable):
     wrapper.average = average
     return wrapper
 
+_ONE_THIRD = 1.0 / 3.0
+_ONE_SIXTH = 1.0 / 6.0
+_TWO_THIRD = 2.0 / 3.0
+
 def rainbow_color_stops(
     n: int = 10,
     lum: float = 0.5,
     end: float = 2 / 3
 ) -> list[tuple[int, int, int]]:
     # https://stackoverflow.com/a/58811633
+    # this is colorsys.hls_to_rgb(hue, lum, 1) unrolled, so
+    # the lightness terms are only computed once for all stops.
+    m2 = lum * 2.0 if lum <= 0.5 else lum + 1.0 - lum
+    m1 = 2.0 * lum - m2
+    m_diff = m2 - m1
+
+    def channel(hue: float) -> int:
+        hue %= 1.0
+        if hue < _ONE_SIXTH:
+            return int((m1 + m_diff * hue * 6.0) * 255)
+        if hue < 0.5:
+            return int(m2 * 255)
+        if hue < _TWO_THIRD:
+            return int((m1 + m_diff * (_TWO_THIRD - hue) * 6.0) * 255)
+        return int(m1 * 255)
+
+    div = max(n - 1, 1)
     return [
-        (r * 255, g * 255, b * 255)
-        for r, g, b in [colorsys.hls_to_rgb(end * i / (n - 1), lum, 1)
-                        for i in range(n)]
+        (channel(hue + _ONE_THIRD), channel(hue), channel(hue - _ONE_THIRD))
+        for hue in [end * i / div for i in range(n)]
     ]
 
 # TODO: genericize this to metric all units?
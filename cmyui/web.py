@@ -4,12 +4,12 @@
 # sockets, mostly with https://github.com/cmyui/gulag in mind.
 
 import asyncio
+import errno
 import gzip
 import http
 import inspect
 import os
 import re
-import select
 import signal
 import socket
 import sys
@@ -25,11 +25,20 @@ from typing import Optional
 from typing import Union
 
 from .logging import Ansi
+from .logging import close_log_files
+from .logging import flush_output
 from .logging import log
 from .logging import printc
 from .logging import RGB
 from .utils import magnitude_fmt_time
 
+try:
+    # use the llhttp-based parser if it's available,
+    # otherwise fall back to our pure-python parsing.
+    import httptools
+except ModuleNotFoundError:
+    httptools = None
+
 __all__ = (
     'Address',
     'STATUS_LINES',
@@ -45,6 +54,12 @@ STATUS_LINES = {
     for c in http.HTTPStatus
 }
 
+# encoded status lines (with line endings) to start responses.
+STATUS_LINES_RAW = {
+    code: f'{status_line}\r\n'.encode()
+    for code, status_line in STATUS_LINES.items()
+}
+
 def ratelimit(period: int, max_count: int,
               default_return: Optional[Any] = None
              ) -> Callable:
@@ -108,36 +123,53 @@ REQUEST_LINE_RGX = re.compile(
     r'HTTP/(?P<httpver>1\.0|1\.1|2\.0|3\.0)$'
 )
 
+HTTP_VERSION_RGX = re.compile(rb'HTTP/(\d)\.(\d)')
+
+# max bytes to read from a client socket while receiving headers
+RECV_CHUNK_SIZE = 8192
+
+# accept() errors caused by running out of resources (fds, memory),
+# after which accepting is paused for ACCEPT_RETRY_DELAY secs.
+ACCEPT_RESOURCE_ERRNOS = frozenset({
+    errno.EMFILE, errno.ENFILE,
+    errno.ENOBUFS, errno.ENOMEM
+})
+ACCEPT_RETRY_DELAY = 1.0
+
+HEADER_LINE_RGX = re.compile(rb'([^:\r\n]+):[ \t]*([^\r\n]*)\r\n')
+
 class CaseInsensitiveDict(dict):
     """A dictionary with case insensitive keys."""
+    # keys are stored lowercased, so each
+    # access is only a single dict operation.
     def __init__(self, *args, **kwargs) -> None:
-        self._keystore = {}
         d = dict(*args, **kwargs)
-        for k in d.keys():
-            self._keystore[k.lower()] = k
-        return super().__init__(*args, **kwargs)
+        return super().__init__({k.lower(): v for k, v in d.items()})
 
     def __setitem__(self, k, v) -> None:
-        self._keystore[k.lower()] = k
-        return super().__setitem__(k, v)
+        return super().__setitem__(k.lower(), v)
 
     def __getitem__(self, k) -> str:
-        k_lower = k.lower()
-        if k_lower in self._keystore:
-            k = self._keystore[k_lower]
-        return super().__getitem__(k)
+        return super().__getitem__(k.lower())
 
     def __contains__(self, k: str) -> bool:
-        k_lower = k.lower()
-        if k_lower in self._keystore:
-            k = self._keystore[k_lower]
-        return super().__contains__(k)
+        return super().__contains__(k.lower())
+
+    def __delitem__(self, k) -> None:
+        return super().__delitem__(k.lower())
 
     def get(self, k, failobj=None) -> Optional[str]:
-        k_lower = k.lower()
-        if k_lower in self._keystore:
-            k = self._keystore[k_lower]
-        return super().get(k, failobj)
+        return super().get(k.lower(), failobj)
+
+    def pop(self, k, *args) -> Optional[str]:
+        return super().pop(k.lower(), *args)
+
+    def setdefault(self, k, default=None) -> Optional[str]:
+        return super().setdefault(k.lower(), default)
+
+    def update(self, *args, **kwargs) -> None:
+        d = dict(*args, **kwargs)
+        return super().update({k.lower(): v for k, v in d.items()})
 
 class Connection:
     __slots__ = (
@@ -171,27 +203,36 @@ class Connection:
 
         self.files: dict[str, bytes] = {}
 
+        self._buf = bytearray()
+
         # Response params
         self.resp_code = 200
         self.resp_headers = {}
 
-        self._buf = bytearray()
-
     """ Request methods """
 
     def _parse_urlencoded(self, data: str) -> None:
-        for a_pair in data.split('&'):
-            a_key, a_val = a_pair.split('=', 1)
-            self.args[a_key] = a_val
+        self.args.update(urllib.parse.parse_qsl(data, keep_blank_values=True))
 
-    def _parse_headers(self, data: str) -> None:
+    def _parse_headers(self, data: bytes) -> None:
         """Parse the http headers from the internal body."""
-        # split up headers into http line & header lines
-        http_line, *header_lines = data.split('\r\n')
+        if httptools is not None:
+            self._parse_headers_httptools(data)
+        else:
+            # parse http line
+            http_line_end = data.find(b'\r\n')
+            cmd, raw_path, httpver = data[:http_line_end].split(b' ', 2)
+
+            if not (m := HTTP_VERSION_RGX.fullmatch(httpver)):
+                raise ValueError(f'Invalid http version {httpver!r}')
 
-        # parse http line
-        self.cmd, self.raw_path, _httpver = http_line.split(' ', 2)
-        self.httpver = float(_httpver[5:])
+            self.cmd = cmd.decode()
+            self.raw_path = raw_path.decode()
+            self.httpver = int(m[1]) + int(m[2]) / 10
+
+            # parse header lines in a single pass over the raw bytes
+            for h_key, h_val in HEADER_LINE_RGX.findall(data, http_line_end + 2):
+                self.headers[h_key.decode()] = h_val.decode()
 
         # parse urlencoded args from raw_path
         if (args_offs := self.raw_path.find('?')) != -1:
@@ -200,103 +241,169 @@ class Connection:
         else:
             self.path = self.raw_path
 
-        # parse header lines
-        for h_key, h_val in [h.split(': ', 1) for h in header_lines]:
-            self.headers[h_key] = h_val
+    def _parse_headers_httptools(self, data: bytes) -> None:
+        """Parse the http headers from the internal body using httptools."""
+        parser = httptools.HttpRequestParser(self)
 
-    def _parse_multipart(self) -> None:
+        try:
+            parser.feed_data(data)
+        except httptools.HttpParserUpgrade:
+            # we don't support upgrades, but
+            # the headers are parsed already.
+            pass
+
+        self.cmd = parser.get_method().decode()
+        self.httpver = float(parser.get_http_version())
+
+    # httptools parser callbacks
+
+    def on_url(self, url: bytes) -> None:
+        self.raw_path = url.decode()
+
+    def on_header(self, name: bytes, value: bytes) -> None:
+        self.headers[name.decode()] = value.decode()
+
+    def _parse_multipart(self, body_offs: int, body_end: int) -> None:
         """Parse multipart/form-data from the internal body."""
         boundary = self.headers['Content-Type'].split('boundary=', 1)[1]
+        delim = f'--{boundary}'.encode()
+        buf = self._buf
+
+        # walk the receive buffer in place from one delimiter
+        # to the next; only the parts themselves are copied out.
+        part_start = buf.find(delim, body_offs, body_end)
 
-        for param in self.body.tobytes().split(f'--{boundary}'.encode())[1:-1]:
-            headers, _body = param.split(b'\r\n\r\n', 1)
-            body = _body[:-2] # remove \r\n
-
-            # find Content-Disposition
-            for header in headers.decode().split('\r\n')[1:]:
-                h_key, h_val = header.split(': ', 1)
-
-                if h_key == 'Content-Disposition':
-                    # find 'name' or 'filename' attribute
-                    attrs = {}
-                    for attr in h_val.split('; ')[1:]:
-                        a_key, _a_val = attr.split('=', 1)
-                        attrs[a_key] = _a_val[1:-1] # remove ""
-
-                    if 'filename' in attrs:
-                        a_val = attrs['filename']
-                        self.files[a_val] = body
-                        break
-                    elif 'name' in attrs:
-                        a_val = attrs['name']
-                        self.multipart_args[a_val] = body.decode()
-                        break
-                    break
-
-    async def parse(self) -> bytes:
-        """Receive & parse the http request from the client."""
+        while part_start != -1:
+            part_start += len(delim)
+
+            if (part_end := buf.find(delim, part_start, body_end)) == -1:
+                # closing delimiter reached.
+                break
+
+            headers_end = buf.find(b'\r\n\r\n', part_start, part_end)
+
+            if headers_end != -1:
+                # skip the \r\n after the delim, and remove
+                # the \r\n before the next delim from the body.
+                headers = buf[part_start + 2:headers_end]
+                body = self.body[headers_end + 4 - body_offs:
+                                 part_end - 2 - body_offs].tobytes()
+                self._parse_multipart_part(headers, body)
+
+            part_start = part_end
+
+    def _parse_multipart_part(self, headers: bytearray, body: bytes) -> None:
+        """Parse a single part of multipart/form-data."""
+        # find Content-Disposition
+        for header in headers.decode().split('\r\n'):
+            h_key, h_val = header.split(': ', 1)
+
+            if h_key == 'Content-Disposition':
+                # find 'name' or 'filename' attribute
+                attrs = {}
+                for attr in h_val.split('; ')[1:]:
+                    a_key, _a_val = attr.split('=', 1)
+                    attrs[a_key] = _a_val[1:-1] # remove ""
+
+                if 'filename' in attrs:
+                    self.files[attrs['filename']] = body
+                elif 'name' in attrs:
+                    self.multipart_args[attrs['name']] = body.decode()
+
+                break
+
+    async def parse(self) -> bool:
+        """Receive & parse the http request from the client.
+
+           Returns False if the client disconnected before
+           the request (headers & body) was fully received."""
         loop = asyncio.get_running_loop()
 
-        while (body_delim_offs := self._buf.find(b'\r\n\r\n')) == -1:
-            self._buf += await loop.sock_recv(self.client, 1024)
+        # most requests arrive in a single read; receive it directly
+        # into our buffer, and only loop if the headers are incomplete.
+        self._buf = bytearray(RECV_CHUNK_SIZE)
+        nbytes = await loop.sock_recv_into(self.client, self._buf)
+        del self._buf[nbytes:]
+
+        # read until we have all headers; only the newly received
+        # data (and the 3 bytes before it) is scanned each time.
+        scan_offs = 0
+        while (body_delim_offs := self._buf.find(b'\r\n\r\n', scan_offs)) == -1:
+            scan_offs = max(len(self._buf) - 3, 0)
+
+            if not (data := await loop.sock_recv(self.client, RECV_CHUNK_SIZE)):
+                # connection closed before headers were complete.
+                return False
+
+            self._buf += data
 
         # we have all headers, parse them
-        self._parse_headers(self._buf[:body_delim_offs].decode())
+        self._parse_headers(self._buf[:body_delim_offs + 4])
 
-        if 'Content-Length' not in self.headers:
+        if (content_length := self.headers.get('Content-Length')) is None:
             # the request has no body to read.
-            return
+            return True
+
+        body_offs = body_delim_offs + 4
+        body_end = body_offs + int(content_length)
 
-        content_length = int(self.headers['Content-Length'])
-        to_read = ((body_delim_offs + 4) + content_length) - len(self._buf)
+        if (to_read := body_end - len(self._buf)) > 0:
+            # there's more to read; preallocate the exact space
+            # required and read directly into it from the socket.
+            self._buf.extend(bytes(to_read))
+            read_view = memoryview(self._buf)[-to_read:]
+            while to_read:
+                if not (nbytes := await loop.sock_recv_into(self.client, read_view)):
+                    # connection closed before the body was complete.
+                    return False
 
-        if to_read:
-            # there's more to read; preallocate the space
-            # required and read into it from the socket.
-            self._buf += b"\x00" * to_read # is this rly the fastest way?
-            with memoryview(self._buf)[-to_read:] as read_view:
-                while to_read:
-                    nbytes = await loop.sock_recv_into(self.client, read_view)
-                    read_view = read_view[nbytes:]
-                    to_read -= nbytes
+                read_view = read_view[nbytes:]
+                to_read -= nbytes
 
         # all data read from the socket, store a readonly view of the body.
-        self.body = memoryview(self._buf)[body_delim_offs + 4:].toreadonly()
+        self.body = memoryview(self._buf)[body_offs:body_end].toreadonly()
 
         if self.cmd == 'POST':
-            if 'Content-Type' in self.headers:
-                content_type = self.headers['Content-Type']
+            if content_type := self.headers.get('Content-Type'):
                 if content_type.startswith('multipart/form-data'):
-                    self._parse_multipart()
+                    self._parse_multipart(body_offs, body_end)
                 elif content_type == 'application/x-www-form-urlencoded':
-                    self._parse_urlencoded(
-                        urllib.parse.unquote(self.body.tobytes().decode())
-                    ) # hmmm
+                    self._parse_urlencoded(self.body.tobytes().decode())
+
+        return True
 
     """ Response methods """
 
     async def send(self, status: int, body: bytes = b'') -> None:
         """Attach appropriate headers and send data back to the client."""
-        # Insert HTTP response line & content at the beginning of headers.
-        header_lines = [STATUS_LINES[status]]
+        header_lines = []
 
         if body: # Add content-length header if we are sending a body.
             header_lines.append(f'Content-Length: {len(body)}')
 
         # Add all user-specified response headers.
         header_lines.extend(map(': '.join, self.resp_headers.items()))
+        header_lines.append('\r\n')
 
-        # Create an encoded response from the headers.
-        resp = ('\r\n'.join(header_lines) + '\r\n\r\n').encode()
-
-        # Add body to response if we have one to send.
-        if body:
-            resp += body
+        # Create an encoded response from the status line & headers.
+        headers = STATUS_LINES_RAW[status] + '\r\n'.join(header_lines).encode()
 
         # Send all data to the client.
         loop = asyncio.get_running_loop()
         try:
-            await loop.sock_sendall(self.client, resp)
+            # send the headers & body in a single call without joining
+            # them; the socket's non-blocking, so it may be partial.
+            try:
+                sent = self.client.sendmsg([headers, body])
+            except BlockingIOError:
+                sent = 0
+
+            if sent < len(headers):
+                await loop.sock_sendall(self.client, headers[sent:])
+                sent = len(headers)
+
+            if (body_sent := sent - len(headers)) < len(body):
+                await loop.sock_sendall(self.client, memoryview(body)[body_sent:])
         except BrokenPipeError: # TODO: detect this earlier?
             log('Connection closed by client.', Ansi.LRED)
 
@@ -387,7 +494,7 @@ class Server:
     """An asynchronous multi-domain server."""
     __slots__ = (
         'name', 'max_conns', 'gzip', 'debug',
-        'sock_family', 'before_serving', 'after_serving',
+        'reuse_port', 'sock_family', 'before_serving', 'after_serving',
         'domains', 'exceptions',
         'tasks', '_task_coros'
     )
@@ -396,6 +503,7 @@ class Server:
         self.max_conns = kwargs.get('max_conns', 5)
         self.gzip = kwargs.get('gzip', 0) # 0-9 valid levels
         self.debug = kwargs.get('debug', False)
+        self.reuse_port = kwargs.get('reuse_port', False) # inet only
         self.sock_family: Optional[socket.AddressFamily] = None
 
         self.before_serving: Optional[Callable] = None
@@ -497,8 +605,7 @@ class Server:
             # if it's enabled server-side and client supports it
             if (
                 self.gzip > 0 and
-                'Accept-Encoding' in conn.headers and
-                'gzip' in conn.headers['Accept-Encoding'] and
+                'gzip' in conn.headers.get('Accept-Encoding', '') and
                 len(resp) > 1500 # ethernet frame size (minus headers)
             ):
                 # ignore files that're already compressed heavily
@@ -524,7 +631,11 @@ class Server:
 
         # read & parse connection
         conn = Connection(client)
-        await conn.parse()
+        if not await conn.parse():
+            # the client disconnected mid-request;
+            # there's nothing complete to dispatch.
+            client.close()
+            return
 
         if self.debug:
             t2 = clock_ns()
@@ -622,10 +733,6 @@ class Server:
                 if os.path.exists(addr):
                     os.remove(addr)
 
-            # TODO: this whole section is implemented pretty horribly,
-            # there's almost certainly a way to use loop.add_reader rather
-            # than using select, and the rest is a result of using select.
-
             # read/write signal listening socks
             sig_rsock, sig_wsock = os.pipe()
             os.set_blocking(sig_wsock, False)
@@ -635,45 +742,79 @@ class Server:
             lsock = socket.socket(self.sock_family)
             lsock.setblocking(False)
 
+            if self.reuse_port and not self.using_unix_socket:
+                # allow multiple server processes to bind to the same
+                # address; the kernel will balance connections between
+                # their (separate) accept queues.
+                lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
             lsock.bind(addr)
             if self.using_unix_socket:
                 os.chmod(addr, 0o777)
 
             lsock.listen(self.max_conns)
-            log(f'-> Listening @ {addr}', RGB(0x00ff7f))
+            log(f'-> Listening @ {addr}', RGB.from_packed(0x00ff7f))
 
             # TODO: terminal input support (tty, termios fuckery)
             # though, tbh this should be moved into gulag as it's
             # mostly a gulag-specific thing, and it'll be easier
             # to manage all the printing stuff that way.
 
-            should_close = False
             should_restart = False
-
-            while True:
-                await asyncio.sleep(0.01) # skip loop iteration
-                rlist, _, _ = select.select([lsock, sig_rsock], [], [], 0)
-
-                for reader in rlist:
-                    if reader is lsock:
-                        # new connection received for server
-                        client, _ = await loop.sock_accept(lsock)
-                        task = loop.create_task(self.handle(client))
-                        task.add_done_callback(self._default_cb)
-                    elif reader is sig_rsock:
-                        # received a blocked signal, shutdown
-                        sig_received = signal.Signals(os.read(sig_rsock, 1)[0])
-                        if sig_received is signal.SIGINT:
-                            print('\x1b[2K', end='\r') # clear ^C from console
-                        elif sig_received is signal.SIGUSR1:
-                            should_restart = True
-                        log(f'Received {signal.strsignal(sig_received)}', Ansi.LRED)
-                        should_close = True
-                    else:
-                        raise RuntimeError(f'Unknown reader {reader}')
-
-                if should_close:
-                    break
+            should_close = loop.create_future()
+
+            def _accept_conns() -> None:
+                """Accept all pending connections on the listening sock."""
+                # the loop only wakes us when lsock is readable;
+                # drain the whole backlog for each wakeup.
+                while True:
+                    try:
+                        client, _ = lsock.accept()
+                    except (BlockingIOError, InterruptedError,
+                            ConnectionAbortedError):
+                        return
+                    except OSError as exc:
+                        if exc.errno not in ACCEPT_RESOURCE_ERRNOS:
+                            raise
+
+                        # the backlog is still readable, so we'd be woken
+                        # (and fail) continuously; stop listening for a bit.
+                        log(f'Failed to accept connection ({exc}); '
+                            f'pausing for {ACCEPT_RETRY_DELAY}s.', Ansi.LRED)
+                        loop.remove_reader(lsock)
+                        loop.call_later(ACCEPT_RETRY_DELAY, _resume_accepting)
+                        return
+
+                    client.setblocking(False)
+                    task = loop.create_task(self.handle(client))
+                    task.add_done_callback(self._default_cb)
+
+            def _resume_accepting() -> None:
+                if not should_close.done(): # lsock not yet closed
+                    loop.add_reader(lsock, _accept_conns)
+
+            def _handle_signal() -> None:
+                """Handle a signal received through the wakeup fd."""
+                nonlocal should_restart
+
+                # received a blocked signal, shutdown
+                sig_received = signal.Signals(os.read(sig_rsock, 1)[0])
+                if sig_received is signal.SIGINT:
+                    print('\x1b[2K', end='\r') # clear ^C from console
+                elif sig_received is signal.SIGUSR1:
+                    should_restart = True
+                log(f'Received {signal.strsignal(sig_received)}', Ansi.LRED)
+
+                if not should_close.done():
+                    should_close.set_result(None)
+
+            loop.add_reader(lsock, _accept_conns)
+            loop.add_reader(sig_rsock, _handle_signal)
+
+            await should_close
+
+            loop.remove_reader(lsock)
+            loop.remove_reader(sig_rsock)
 
             # server closed, clean things up.
             for sock_fd in {lsock.fileno(), sig_rsock, sig_wsock}:
@@ -753,4 +894,9 @@ class Server:
 
             if should_restart:
                 log('=== Server restarting ===', Ansi.LMAGENTA)
+
+                # execv() doesn't run atexit handlers or
+                # flush buffers, so anything pending is lost.
+                flush_output()
+                close_log_files()
                 os.execv(sys.executable, [sys.executable] + sys.argv)